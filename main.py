@@ -1,11 +1,20 @@
+import csv
+import gc
+import io
 import psycopg2
-import pandas as pd
+from psycopg2.errors import FeatureNotSupported, InsufficientPrivilege
+from psycopg2.extras import execute_batch, execute_values
 from datetime import datetime
 import sys
 
 # Import your DB_CONFIG here
 # from your_config import DB_CONFIG
 
+# Rows sent to the staging table per COPY
+BATCH_SIZE = 10000
+# Rows per INSERT round-trip when COPY is unavailable; Postgres gains little past ~1000
+INSERT_PAGE_SIZE = 500
+
 def get_db_connection():
     """Establish connection to PostgreSQL database"""
     try:
@@ -16,6 +25,65 @@ def get_db_connection():
         print(f"Error connecting to database: {e}")
         raise
 
+def _relax_commit_durability(cursor):
+    """Turn off synchronous commit for the current ingestion transaction"""
+    # The load can simply be rerun after a crash, so skip waiting on the WAL flush at commit
+    cursor.execute("SET LOCAL synchronous_commit = OFF")
+
+def _create_stage_table(cursor):
+    """Create the temp table that ingestion rows are staged in before merging"""
+    # Temp tables are never WAL-logged, so the stage is already as cheap as UNLOGGED
+    cursor.execute("""
+        CREATE TEMP TABLE field_prompts_stage (
+            row_num BIGSERIAL,
+            area TEXT,
+            sub_area TEXT,
+            field TEXT,
+            prompt TEXT
+        ) ON COMMIT DROP
+    """)
+
+def _copy_rows_to_stage(cursor, rows):
+    """Stream a batch of (area, sub_area, field, prompt) rows into the staging table"""
+    # CSV quoting handles tabs, newlines and quotes inside prompts without a custom escaper
+    buffer = io.StringIO()
+    csv.writer(buffer, quoting=csv.QUOTE_MINIMAL).writerows(rows)
+    buffer.seek(0)
+    # FORCE_NOT_NULL keeps empty prompts as '' rather than CSV's default NULL
+    cursor.copy_expert("""
+        COPY field_prompts_stage (area, sub_area, field, prompt) FROM STDIN
+        WITH (FORMAT csv, FORCE_NOT_NULL (area, sub_area, field, prompt))
+    """, buffer)
+
+def _merge_stage(cursor):
+    """Insert staged rows missing from field_prompts and return how many were added"""
+    # Keep the last occurrence of each key, matching drop_duplicates(keep='last')
+    cursor.execute("""
+        INSERT INTO field_prompts (area, sub_area, field, prompt, created_at, updated_at)
+        SELECT DISTINCT ON (area, sub_area, field)
+            area, sub_area, field, prompt, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP
+        FROM field_prompts_stage
+        ORDER BY area, sub_area, field, row_num DESC
+        ON CONFLICT (area, sub_area, field) DO NOTHING
+    """)
+    return cursor.rowcount
+
+def _insert_rows_batched(cursor, rows, page_size=INSERT_PAGE_SIZE):
+    """Insert rows with execute_batch when COPY into a staging table is not permitted"""
+    # rows hold unique keys, so every key not already present is inserted
+    existing_records = execute_values(cursor, """
+        SELECT 1 FROM field_prompts
+        WHERE (area, sub_area, field) IN (VALUES %s)
+    """, [row[:3] for row in rows], page_size=1000, fetch=True)
+    
+    execute_batch(cursor, """
+        INSERT INTO field_prompts (area, sub_area, field, prompt, created_at, updated_at)
+        VALUES (%s, %s, %s, %s, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
+        ON CONFLICT (area, sub_area, field) DO NOTHING
+    """, rows, page_size=page_size)
+    
+    return len(rows) - len(existing_records)
+
 def create_schema():
     """Create the field_prompts table and indexes"""
     conn = get_db_connection()
@@ -37,8 +105,10 @@ def create_schema():
         
         cursor.execute(create_table_query)
         
+        # The UNIQUE(area, sub_area, field) index already serves area and area/sub_area
+        # lookups in field order, so a separate (area, sub_area) index only slows writes
         indexes = [
-            "CREATE INDEX IF NOT EXISTS idx_field_prompts_area_subarea ON field_prompts(area, sub_area);",
+            "DROP INDEX IF EXISTS idx_field_prompts_area_subarea;",
             "CREATE INDEX IF NOT EXISTS idx_field_prompts_field ON field_prompts(field);",
             "CREATE INDEX IF NOT EXISTS idx_field_prompts_updated_at ON field_prompts(updated_at);"
         ]
@@ -57,41 +127,59 @@ def create_schema():
         cursor.close()
         conn.close()
 
-def preview_ingestion(file_path):
+def load_excel_data(file_path):
+    """Read the prompt columns from the Excel file once for preview and ingestion"""
+    # Imported here so schema and stats commands don't pay pandas' import time
+    import pandas as pd
+    
+    expected_columns = ['Area', 'Sub Area', 'Field', 'Prompt']
+    try:
+        with pd.ExcelFile(file_path, engine='openpyxl') as xls:
+            df = pd.read_excel(xls, usecols=lambda col: col in expected_columns, dtype=str)
+    except Exception as e:
+        print(f"❌ Error reading Excel file: {e}")
+        return None
+    
+    if not all(col in df.columns for col in expected_columns):
+        print(f"Missing columns. Expected: {expected_columns}")
+        return None
+    
+    return df
+
+def preview_ingestion(df):
     """Preview what records would be new vs existing before actual ingestion"""
     try:
-        df = pd.read_excel(file_path)
-        
-        expected_columns = ['Area', 'Sub Area', 'Field', 'Prompt']
-        if not all(col in df.columns for col in expected_columns):
-            print(f"Missing columns. Expected: {expected_columns}")
-            return False
-        
         df = df.dropna(subset=['Area', 'Sub Area', 'Field'])
         df = df.drop_duplicates(subset=['Area', 'Sub Area', 'Field'], keep='last')
         
         conn = get_db_connection()
         cursor = conn.cursor()
         
-        new_count = 0
-        existing_count = 0
+        keys = set(zip(
+            df['Area'].str.strip(),
+            df['Sub Area'].str.strip(),
+            df['Field'].str.strip()
+        ))
         
-        for _, row in df.iterrows():
-            cursor.execute("""
-                SELECT id FROM field_prompts 
-                WHERE area = %s AND sub_area = %s AND field = %s
-            """, (row['Area'].strip(), row['Sub Area'].strip(), row['Field'].strip()))
-            
-            if cursor.fetchone():
-                existing_count += 1
-            else:
-                new_count += 1
+        # Let Postgres count matches with one anti-join; each page of keys returns one row
+        counts = execute_values(cursor, """
+            WITH candidates (area, sub_area, field) AS (VALUES %s)
+            SELECT
+                COUNT(*) FILTER (WHERE fp.id IS NOT NULL),
+                COUNT(*) FILTER (WHERE fp.id IS NULL)
+            FROM candidates c
+            LEFT JOIN field_prompts fp
+                ON fp.area = c.area AND fp.sub_area = c.sub_area AND fp.field = c.field
+        """, list(keys), page_size=5000, fetch=True)
+        
+        existing_count = sum(row[0] for row in counts)
+        new_count = sum(row[1] for row in counts)
         
         print(f"Preview: {new_count} new records, {existing_count} existing records")
         return True
         
     except Exception as e:
-        print(f"Error previewing file: {e}")
+        print(f"Error previewing data: {e}")
         return False
     finally:
         if 'cursor' in locals():
@@ -114,19 +202,16 @@ def check_existing_records():
         cursor.close()
         conn.close()
 
-def ingest_excel_data(file_path):
-    """Read Excel file and ingest data into database"""
+def ingest_excel_data(df):
+    """Ingest the loaded Excel data into database"""
     try:
-        df = pd.read_excel(file_path)
-        
-        expected_columns = ['Area', 'Sub Area', 'Field', 'Prompt']
-        if not all(col in df.columns for col in expected_columns):
-            print(f"Missing columns. Expected: {expected_columns}")
-            return False
-        
         original_count = len(df)
         df = df.dropna(subset=['Area', 'Sub Area', 'Field'])
         df = df.fillna('')
+        # Strip before de-duplicating so keys that only differ by whitespace collapse too
+        for col in ('Area', 'Sub Area', 'Field'):
+            df[col] = df[col].str.strip()
+        df['Prompt'] = df['Prompt'].astype(str).str.strip()
         df = df.drop_duplicates(subset=['Area', 'Sub Area', 'Field'], keep='last')
         
         print(f"Processing {len(df)} records")
@@ -134,60 +219,105 @@ def ingest_excel_data(file_path):
         conn = get_db_connection()
         cursor = conn.cursor()
         
-        insert_query = """
-        INSERT INTO field_prompts (area, sub_area, field, prompt, created_at, updated_at)
-        VALUES (%s, %s, %s, %s, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
-        ON CONFLICT (area, sub_area, field) DO NOTHING
-        """
+        rows = list(df[['Area', 'Sub Area', 'Field', 'Prompt']].itertuples(index=False, name=None))
         
-        success_count = 0
-        error_count = 0
-        skipped_count = 0
-        new_count = 0
-        
-        for index, row in df.iterrows():
-            try:
-                cursor.execute("""
-                    SELECT id FROM field_prompts 
-                    WHERE area = %s AND sub_area = %s AND field = %s
-                """, (row['Area'].strip(), row['Sub Area'].strip(), row['Field'].strip()))
-                
-                existing_record = cursor.fetchone()
-                
-                cursor.execute(insert_query, (
-                    row['Area'].strip(),
-                    row['Sub Area'].strip(),
-                    row['Field'].strip(),
-                    str(row['Prompt']).strip() if pd.notna(row['Prompt']) else ''
-                ))
-                
-                if existing_record:
-                    skipped_count += 1
-                else:
-                    new_count += 1
-                    
-                success_count += 1
-                
-            except Exception as e:
-                error_count += 1
-                print(f"Error processing row {index}: {e}")
-                conn.rollback()
-                conn = get_db_connection()
-                cursor = conn.cursor()
+        _relax_commit_durability(cursor)
+        
+        # Stream all rows into a temp staging table with COPY, then merge in one statement
+        cursor.execute("SAVEPOINT stage_copy")
+        try:
+            _create_stage_table(cursor)
+            for start in range(0, len(rows), BATCH_SIZE):
+                _copy_rows_to_stage(cursor, rows[start:start + BATCH_SIZE])
+            new_count = _merge_stage(cursor)
+        except (InsufficientPrivilege, FeatureNotSupported) as e:
+            print(f"COPY staging unavailable ({e}), falling back to batched inserts")
+            cursor.execute("ROLLBACK TO SAVEPOINT stage_copy")
+            new_count = _insert_rows_batched(cursor, rows)
+        skipped_count = len(rows) - new_count
         
         conn.commit()
         
-        print(f"Ingestion completed: {new_count} new, {skipped_count} skipped, {error_count} errors")
+        print(f"Ingestion completed: {new_count} new, {skipped_count} skipped")
         return True
         
+    except Exception as e:
+        print(f"❌ Error ingesting data: {e}")
+        return False
+    finally:
+        if 'cursor' in locals():
+            cursor.close()
+        if 'conn' in locals():
+            conn.close()
+
+def ingest_excel_file_streaming(file_path, batch_size=BATCH_SIZE):
+    """Stream a large Excel file into database without loading it into a DataFrame"""
+    import openpyxl
+    
+    expected_columns = ['Area', 'Sub Area', 'Field', 'Prompt']
+    try:
+        wb = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
     except Exception as e:
         print(f"❌ Error reading Excel file: {e}")
         return False
+    
+    try:
+        rows_iter = wb.active.iter_rows(values_only=True)
+        header = next(rows_iter, ())
+        if not all(col in header for col in expected_columns):
+            print(f"Missing columns. Expected: {expected_columns}")
+            return False
+        positions = [header.index(col) for col in expected_columns]
+        
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        _relax_commit_durability(cursor)
+        _create_stage_table(cursor)
+        
+        batch = []
+        for values in rows_iter:
+            area, sub_area, field, prompt = (values[i] if i < len(values) else None for i in positions)
+            if area is None or sub_area is None or field is None:
+                continue
+            
+            batch.append((
+                str(area).strip(),
+                str(sub_area).strip(),
+                str(field).strip(),
+                str(prompt).strip() if prompt is not None else ''
+            ))
+            
+            if len(batch) >= batch_size:
+                _copy_rows_to_stage(cursor, batch)
+                batch.clear()
+                gc.collect()
+        
+        if batch:
+            _copy_rows_to_stage(cursor, batch)
+            batch.clear()
+        
+        # Count distinct keys so in-file duplicates aren't reported as skipped, like the DataFrame path
+        cursor.execute("SELECT COUNT(DISTINCT (area, sub_area, field)) FROM field_prompts_stage;")
+        unique_count = cursor.fetchone()[0]
+        print(f"Processing {unique_count} records")
+        
+        new_count = _merge_stage(cursor)
+        skipped_count = unique_count - new_count
+        
+        conn.commit()
+        
+        print(f"Ingestion completed: {new_count} new, {skipped_count} skipped")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Error ingesting data: {e}")
+        return False
     finally:
         if 'cursor' in locals():
             cursor.close()
         if 'conn' in locals():
             conn.close()
+        wb.close()
 
 def get_database_stats():
     """Get database statistics"""
@@ -195,20 +325,15 @@ def get_database_stats():
     try:
         cursor = conn.cursor()
         
-        cursor.execute("SELECT COUNT(*) FROM field_prompts;")
-        total_records = cursor.fetchone()[0]
-        
-        cursor.execute("SELECT COUNT(DISTINCT area) FROM field_prompts;")
-        unique_areas = cursor.fetchone()[0]
-        
-        cursor.execute("SELECT COUNT(DISTINCT sub_area) FROM field_prompts;")
-        unique_sub_areas = cursor.fetchone()[0]
-        
         cursor.execute("""
-            SELECT COUNT(*) FROM field_prompts 
-            WHERE updated_at >= CURRENT_DATE - INTERVAL '7 days'
+            SELECT
+                COUNT(*),
+                COUNT(DISTINCT area),
+                COUNT(DISTINCT sub_area),
+                COUNT(*) FILTER (WHERE updated_at >= CURRENT_DATE - INTERVAL '7 days')
+            FROM field_prompts;
         """)
-        recent_updates = cursor.fetchone()[0]
+        total_records, unique_areas, unique_sub_areas, recent_updates = cursor.fetchone()
         
         return {
             'total_records': total_records,
@@ -239,17 +364,26 @@ def main():
             print(f"   {key.replace('_', ' ').title()}: {value}")
     
     excel_file = "Field_prompts.xlsx"
-    print(f"\n3. Previewing ingestion for {excel_file}...")
-    preview_success = preview_ingestion(excel_file)
-    
-    if preview_success:
-        proceed = input("\nProceed with ingestion? (y/n): ").strip().lower()
-        if proceed != 'y':
-            print("Ingestion cancelled")
+    if '--stream' in sys.argv:
+        # Large workbooks skip the DataFrame preview and stream straight into the database
+        print(f"\n3. Streaming ingestion for {excel_file}...")
+        success = ingest_excel_file_streaming(excel_file)
+    else:
+        df = load_excel_data(excel_file)
+        if df is None:
             return
-    
-    print(f"\n4. Starting data ingestion...")
-    success = ingest_excel_data(excel_file)
+        
+        print(f"\n3. Previewing ingestion for {excel_file}...")
+        preview_success = preview_ingestion(df)
+        
+        if preview_success:
+            proceed = input("\nProceed with ingestion? (y/n): ").strip().lower()
+            if proceed != 'y':
+                print("Ingestion cancelled")
+                return
+        
+        print(f"\n4. Starting data ingestion...")
+        success = ingest_excel_data(df)
     
     if success:
         print("\n5. Final Database Stats:")
@@ -35,8 +35,10 @@ logging.basicConfig(
 )
 
 
+WORD_RE = re.compile(r"\w+")
+
 count_length = lambda d: sum(len(d[val]) for val in d)
-count_words = lambda d: sum(len(re.findall(r"\w+", d[val])) for val in d)
+count_words = lambda d: sum(len(WORD_RE.findall(d[val])) for val in d)
 key_list = [
     "Hook",
     "Intro",
@@ -59,18 +61,14 @@ def extract_tweet(openai_tweet: str, key_list: list) -> dict:
         - dictionary: templated tweet
     """
     template = {}
-    # Iterate through key list
+    # locate every key once, each position is both a start and the previous end
+    positions = [openai_tweet.find(key) for key in key_list]
     for i, key in enumerate(key_list):
         # find starting position
-        start = openai_tweet.find(key_list[i]) + len(key_list[i]) + 2
-        if i != len(key_list) - 1:
-            # using ending position, subset str and append to template
-            end = openai_tweet.find(key_list[i + 1])
-            line = openai_tweet[start:end]
-            template[key_list[i]] = line
-        else:
-            # if final word in list, only subsection by start word
-            template[key_list[i]] = openai_tweet[start:]
+        start = positions[i] + len(key) + 2
+        # if final word in list, only subsection by start word
+        end = positions[i + 1] if i != len(key_list) - 1 else None
+        template[key] = openai_tweet[start:end]
     return template
 
 
@@ -1,6 +1,5 @@
 import streamlit as st
-import psycopg2
-import pandas as pd
+from psycopg2.pool import ThreadedConnectionPool
 from datetime import datetime
 
 # Database configuration - Replace with your actual values
@@ -12,45 +11,41 @@ DB_CONFIG = {
     'port': 5432
 }
 
+@st.cache_resource
+def get_connection_pool():
+    # Shared across reruns and sessions so each query reuses an open connection
+    return ThreadedConnectionPool(minconn=1, maxconn=10, **DB_CONFIG)
+
 def get_db_connection():
     try:
-        conn = psycopg2.connect(**DB_CONFIG)
+        conn = get_connection_pool().getconn()
         conn.autocommit = False
         return conn
     except Exception as e:
         st.error(f"Error connecting to database: {e}")
         st.stop()
 
-@st.cache_data
-def get_unique_areas():
-    conn = get_db_connection()
-    try:
-        cursor = conn.cursor()
-        cursor.execute("SELECT DISTINCT area FROM field_prompts ORDER BY area;")
-        areas = [row[0] for row in cursor.fetchall()]
-        return areas
-    except Exception as e:
-        st.error(f"Error fetching areas: {e}")
-        return []
-    finally:
-        cursor.close()
-        conn.close()
+def release_db_connection(conn):
+    get_connection_pool().putconn(conn)
 
-@st.cache_data
-def get_sub_areas_for_area(area):
+@st.cache_data(ttl=600)
+def get_area_tree():
     conn = get_db_connection()
     try:
         cursor = conn.cursor()
-        cursor.execute("SELECT DISTINCT sub_area FROM field_prompts WHERE area = %s ORDER BY sub_area;", (area,))
-        sub_areas = [row[0] for row in cursor.fetchall()]
-        return sub_areas
-    except Exception as e:
-        st.error(f"Error fetching sub areas: {e}")
-        return []
+        cursor.execute("""
+            SELECT area, array_agg(DISTINCT sub_area ORDER BY sub_area)
+            FROM field_prompts
+            GROUP BY area
+            ORDER BY area;
+        """)
+        area_tree = dict(cursor.fetchall())
+        return area_tree
     finally:
         cursor.close()
-        conn.close()
+        release_db_connection(conn)
 
+@st.cache_data(ttl=300, show_spinner=False)
 def get_prompts_for_area_subarea(area, sub_area):
     conn = get_db_connection()
     try:
@@ -63,12 +58,9 @@ def get_prompts_for_area_subarea(area, sub_area):
         """, (area, sub_area))
         results = cursor.fetchall()
         return results
-    except Exception as e:
-        st.error(f"Error fetching prompts: {e}")
-        return []
     finally:
         cursor.close()
-        conn.close()
+        release_db_connection(conn)
 
 def update_prompt(record_id, new_prompt):
     conn = get_db_connection()
@@ -87,16 +79,14 @@ def update_prompt(record_id, new_prompt):
         return False
     finally:
         cursor.close()
-        conn.close()
+        release_db_connection(conn)
 
 def get_database_stats():
     conn = get_db_connection()
     try:
         cursor = conn.cursor()
-        cursor.execute("SELECT COUNT(*) FROM field_prompts;")
-        total_records = cursor.fetchone()[0]
-        cursor.execute("SELECT MAX(updated_at) FROM field_prompts;")
-        last_updated = cursor.fetchone()[0]
+        cursor.execute("SELECT COUNT(*), MAX(updated_at) FROM field_prompts;")
+        total_records, last_updated = cursor.fetchone()
         return {
             'total_records': total_records,
             'last_updated': last_updated
@@ -106,7 +96,7 @@ def get_database_stats():
         return None
     finally:
         cursor.close()
-        conn.close()
+        release_db_connection(conn)
 
 def main():
     st.set_page_config(
@@ -133,7 +123,13 @@ def main():
     with col1:
         st.header("Select Filters")
         
-        areas = get_unique_areas()
+        # Errors are handled here so a failed query is never cached as an empty tree
+        try:
+            area_tree = get_area_tree()
+        except Exception as e:
+            st.error(f"Error fetching areas: {e}")
+            return
+        areas = list(area_tree)
         if not areas:
             st.warning("No areas found. Please run data ingestion first.")
             return
@@ -141,7 +137,7 @@ def main():
         selected_area = st.selectbox("Select Area:", areas)
         
         if selected_area:
-            sub_areas = get_sub_areas_for_area(selected_area)
+            sub_areas = area_tree.get(selected_area, [])
             if not sub_areas:
                 st.warning(f"No sub areas found for: {selected_area}")
                 return
@@ -154,7 +150,12 @@ def main():
         st.header("Prompts")
         
         if selected_area and selected_sub_area:
-            prompts = get_prompts_for_area_subarea(selected_area, selected_sub_area)
+            # Errors are handled here so a failed query is never cached as an empty result
+            try:
+                prompts = get_prompts_for_area_subarea(selected_area, selected_sub_area)
+            except Exception as e:
+                st.error(f"Error fetching prompts: {e}")
+                return
             
             if not prompts:
                 st.info(f"No prompts found for {selected_area} -> {selected_sub_area}")